@@ -4,10 +4,12 @@ from flask import Flask
 from .extensions import db
 from .routes import bp
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
     # load config.py (or environment vars)
     app.config.from_pyfile('../config.py')
+    if test_config:
+        app.config.update(test_config)
     # ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
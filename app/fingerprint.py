@@ -0,0 +1,314 @@
+# app/fingerprint.py
+import hashlib
+import random
+import struct
+from math import radians, sin, cos, asin, sqrt
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from .extensions import db
+from .models import Activity, TrackFingerprint, TrackFingerprintBand
+
+GEOHASH_PRECISION = 7          # ~150m x 150m cells, coarse enough to absorb GPS noise
+NUM_PERM          = 64         # MinHash sketch length
+NUM_BANDS         = 16         # LSH bands (NUM_PERM / NUM_BANDS rows each)
+ROWS_PER_BAND     = NUM_PERM // NUM_BANDS
+
+# two tracks are near duplicates when they started and ended close together,
+# cover about the same distance and their estimated Jaccard similarity is at
+# least this high
+NEAR_DUPLICATE_THRESHOLD = 0.8
+START_TIME_TOLERANCE     = timedelta(minutes=10)
+END_TIME_TOLERANCE       = timedelta(minutes=10)
+DISTANCE_TOLERANCE       = 0.1      # relative difference in track length
+
+_GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+_MERSENNE_PRIME   = (1 << 61) - 1
+_SKETCH_FORMAT    = f'<{NUM_PERM}Q'
+
+# fixed seed so sketches stay comparable across processes and restarts
+_rng = random.Random(0x7AC4)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def geohash(lat, lon, precision=GEOHASH_PRECISION):
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[ch])
+            bits, ch = 0, 0
+    return ''.join(chars)
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_time(text):
+    if not text:
+        return None
+    try:
+        t = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    # stored naive in UTC, same as Activity.created_at
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc).replace(tzinfo=None)
+    return t
+
+
+def parse_gpx(data):
+    """Return ([(lat, lon), ...], start_time, end_time) for the track points in a GPX document."""
+    root = ET.fromstring(data)
+    points = []
+    start_time = end_time = None
+    for el in root.iter():
+        if _localname(el.tag) not in ('trkpt', 'rtept'):
+            continue
+        try:
+            points.append((float(el.get('lat')), float(el.get('lon'))))
+        except (TypeError, ValueError):
+            continue
+        for child in el:
+            if _localname(child.tag) == 'time':
+                t = _parse_time(child.text)
+                if t is not None:
+                    start_time = start_time or t
+                    end_time = t
+                break
+    return points, start_time, end_time
+
+
+def track_length(points):
+    """Length of the track in meters (haversine between consecutive points)."""
+    total = 0.0
+    for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+        lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+        a = sin((lat2 - lat1) / 2)**2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2)**2
+        total += 6371000.0 * 2 * asin(sqrt(a))
+    return total
+
+
+def cell_sequence(points):
+    """Quantize points to geohash cells, collapsing consecutive repeats."""
+    cells = []
+    for lat, lon in points:
+        cell = geohash(lat, lon)
+        if not cells or cells[-1] != cell:
+            cells.append(cell)
+    return cells
+
+
+def _cell_hash(cell):
+    digest = hashlib.blake2b(cell.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def minhash(cells):
+    """
+    MinHash sketch of the set of visited cells.
+
+    Cells are used unordered: GPS jitter across cell borders breaks ordered
+    shingles. Loops over the same cells are told apart by `same_effort`.
+    """
+    hashes = [_cell_hash(c) for c in set(cells)]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_keys(sketch):
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = sketch[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'<{ROWS_PER_BAND}Q', *rows), digest_size=8)
+        keys.append(f'{band:02d}{digest.hexdigest()}')
+    return keys
+
+
+def pack_sketch(sketch):
+    return struct.pack(_SKETCH_FORMAT, *sketch)
+
+
+def unpack_sketch(blob):
+    return list(struct.unpack(_SKETCH_FORMAT, blob))
+
+
+def similarity(sketch_a, sketch_b):
+    """Estimated Jaccard similarity of two MinHash sketches."""
+    return sum(a == b for a, b in zip(sketch_a, sketch_b)) / NUM_PERM
+
+
+def fingerprint_gpx(data, user_id, fallback_start=None, fallback_elapsed=None):
+    """
+    Build an unsaved TrackFingerprint for a GPX document.
+
+    `fallback_start` / `fallback_elapsed` (seconds) stand in for the track's
+    own timestamps when it has none. Returns None if the document can't be
+    parsed or has no track points, in which case the upload simply isn't
+    deduplicated.
+    """
+    try:
+        points, start_time, end_time = parse_gpx(data)
+    except ET.ParseError:
+        return None
+    if not points:
+        return None
+
+    if start_time is None:
+        start_time = fallback_start
+        end_time = None
+    if end_time is None and start_time is not None and fallback_elapsed is not None:
+        end_time = start_time + timedelta(seconds=fallback_elapsed)
+    cells = cell_sequence(points)
+    sketch = minhash(cells)
+
+    exact = hashlib.sha1()
+    exact.update((start_time.isoformat() if start_time else '').encode())
+    exact.update(''.join(cells).encode())
+
+    return TrackFingerprint(
+        user_id    = user_id,
+        start_time = start_time,
+        end_time   = end_time,
+        distance   = track_length(points),
+        exact_hash = exact.hexdigest(),
+        sketch     = pack_sketch(sketch),
+        bands      = [TrackFingerprintBand(key=k) for k in band_keys(sketch)],
+    )
+
+
+def same_effort(a, b):
+    """
+    Whether two fingerprints describe the same recording of an activity.
+
+    Visited cells alone can't tell a 2-lap warm-up from a 10-lap workout on
+    the same loop, so near duplicates must also end at about the same time
+    and cover about the same distance.
+    """
+    if a.end_time is not None and b.end_time is not None:
+        if abs(a.end_time - b.end_time) > END_TIME_TOLERANCE:
+            return False
+    longest = max(a.distance, b.distance)
+    if longest > 0 and abs(a.distance - b.distance) / longest > DISTANCE_TOLERANCE:
+        return False
+    return True
+
+
+def find_duplicate(fp, before_id=None, exclude=()):
+    """
+    Look up an existing activity of the same user that duplicates `fp`.
+
+    Returns (activity_id, 'exact' | 'near', similarity) or None.
+    `before_id` restricts matches to older activities and `exclude` skips
+    the given activity ids (both used by the batch dedupe job). Fingerprints
+    whose activity no longer exists are never matched.
+    """
+    base = (
+        TrackFingerprint.query
+                        .join(Activity, Activity.id == TrackFingerprint.activity_id)
+                        .filter(TrackFingerprint.user_id == fp.user_id)
+    )
+    if before_id is not None:
+        base = base.filter(TrackFingerprint.activity_id < before_id)
+    if exclude:
+        base = base.filter(TrackFingerprint.activity_id.notin_(list(exclude)))
+
+    exact = (
+        base.filter(TrackFingerprint.exact_hash == fp.exact_hash)
+            .order_by(TrackFingerprint.activity_id)
+            .first()
+    )
+    if exact:
+        return exact.activity_id, 'exact', 1.0
+
+    # near duplicates must have started around the same time, otherwise
+    # running the same route twice would look like a duplicate
+    if fp.start_time is None:
+        return None
+
+    candidates = (
+        base.join(TrackFingerprint.bands)
+            .filter(TrackFingerprintBand.key.in_([b.key for b in fp.bands]))
+            .filter(TrackFingerprint.start_time.between(
+                fp.start_time - START_TIME_TOLERANCE,
+                fp.start_time + START_TIME_TOLERANCE))
+            .distinct()
+            .all()
+    )
+
+    sketch = unpack_sketch(fp.sketch)
+    best = None
+    for cand in candidates:
+        if not same_effort(fp, cand):
+            continue
+        score = similarity(sketch, unpack_sketch(cand.sketch))
+        if score >= NEAR_DUPLICATE_THRESHOLD and (best is None or score > best[2]):
+            best = (cand.activity_id, 'near', score)
+    return best
+
+
+def copy_fingerprint(fp):
+    """Unsaved copy of `fp`, so it can be attached to another activity."""
+    return TrackFingerprint(
+        user_id    = fp.user_id,
+        start_time = fp.start_time,
+        end_time   = fp.end_time,
+        distance   = fp.distance,
+        exact_hash = fp.exact_hash,
+        sketch     = fp.sketch,
+        bands      = [TrackFingerprintBand(key=b.key) for b in fp.bands],
+    )
+
+
+def merge_into(existing, fingerprint, description, distance, elapsed_time):
+    """
+    Merge a duplicate recording into `existing`.
+
+    Fills in a missing description, distance or elapsed time, and takes over
+    the duplicate's (unsaved) fingerprint, distance and elapsed time if its
+    track is longer. Returns True in that case; the caller then has to move
+    the duplicate's GPX file onto the existing activity once committed.
+    """
+    if not existing.description:
+        existing.description = description
+    if existing.distance is None:
+        existing.distance = distance
+    if existing.elapsed_time is None:
+        existing.elapsed_time = elapsed_time
+
+    # keep whichever recording covers more of the activity
+    old = existing.fingerprint
+    if old is not None and fingerprint.distance <= old.distance:
+        return False
+    if old is not None:
+        db.session.delete(old)
+        db.session.flush()  # free the primary key before the new fingerprint takes it
+    existing.fingerprint = fingerprint
+    existing.distance = distance
+    existing.elapsed_time = elapsed_time
+    return True
@@ -121,6 +121,13 @@ class Activity(db.Model):
         'User',
         back_populates='activities'
     )
+
+    fingerprint = db.relationship(
+        'TrackFingerprint',
+        back_populates='activity',
+        cascade='all, delete-orphan',
+        uselist=False
+    )
     
     def to_dict(self):
         return {
@@ -133,4 +140,42 @@ class Activity(db.Model):
             'distance': self.distance,
             'elapsed_time': self.elapsed_time
         }
-    
+
+
+class TrackFingerprint(db.Model):
+    """Compact signature of an activity's GPX track, used for duplicate detection."""
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), primary_key=True)
+    user_id     = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    start_time  = db.Column(db.DateTime, nullable=True)
+    end_time    = db.Column(db.DateTime, nullable=True)
+    distance    = db.Column(db.Float, nullable=False)         # track length in meters
+    exact_hash  = db.Column(db.String(40), nullable=False)
+    sketch      = db.Column(db.LargeBinary, nullable=False)   # packed MinHash values
+
+    activity = db.relationship(
+        'Activity',
+        back_populates='fingerprint'
+    )
+
+    bands = db.relationship(
+        'TrackFingerprintBand',
+        back_populates='fingerprint',
+        cascade='all, delete-orphan'
+    )
+
+    __table_args__ = (
+        db.Index('ix_track_fingerprint_user_exact', 'user_id', 'exact_hash'),
+        db.Index('ix_track_fingerprint_user_start', 'user_id', 'start_time'),
+    )
+
+
+class TrackFingerprintBand(db.Model):
+    """One LSH band of a fingerprint's MinHash sketch; shared keys mark near-duplicate candidates."""
+    id          = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('track_fingerprint.activity_id'), nullable=False, index=True)
+    key         = db.Column(db.String(18), nullable=False, index=True)
+
+    fingerprint = db.relationship(
+        'TrackFingerprint',
+        back_populates='bands'
+    )
@@ -2,11 +2,13 @@
 # app/routes.py
 import os
 import json
+import tempfile
 from datetime import datetime
 from flask import Blueprint, request, jsonify, send_from_directory, abort, current_app
 from werkzeug.utils import secure_filename
 from .extensions import db
-from .models import Map, User, Activity
+from .models import Map, User, Activity, TrackFingerprint
+from .fingerprint import fingerprint_gpx, find_duplicate, merge_into
 from sqlalchemy import desc
 from sqlalchemy.orm import joinedload
 from typing import List, TYPE_CHECKING
@@ -14,6 +16,13 @@ from typing import List, TYPE_CHECKING
 bp = Blueprint('main', __name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'gpx'}
+# what /activities/upload does when the GPX duplicates an existing activity:
+#   reject - respond 409 with the existing activity's id (default)
+#   merge  - keep the existing activity and its title; take over the upload's
+#            GPX, distance and elapsed time if its track is longer, and fill
+#            in a missing description
+#   allow  - create the activity anyway
+DUPLICATE_POLICIES = {'reject', 'merge', 'allow'}
 
 def allowed_file(filename):
     return (
@@ -232,6 +241,21 @@ def delete_map(map_id):
     # 5) no content
     return '', 204
 
+def merge_activity(existing, fingerprint, gpx_file, description, distance, elapsed_time):
+    """
+    Merge an upload into `existing`. Returns the path of a temporary copy of
+    the upload's GPX if it should replace the existing one, or None; the
+    caller moves it into place once the merge is committed.
+    """
+    if not merge_into(existing, fingerprint, description, distance, elapsed_time):
+        return None
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.gpx')
+    os.close(fd)
+    gpx_file.save(tmp_path)
+    return tmp_path
+
 @bp.route('/activities/upload', methods=['POST'])
 def create_activity():
     title        = request.form.get('title')
@@ -242,6 +266,7 @@ def create_activity():
     gpx_file     = request.files.get('gpx')
     distance     = request.form.get('distance')
     elapsed_time = request.form.get('elapsed_time')
+    on_duplicate = request.form.get('on_duplicate', 'reject')
 
     print("Distance", distance)
 
@@ -262,13 +287,47 @@ def create_activity():
     if missing:
         print("Missing fields:", missing)
         return jsonify(error=f"Missing fields: {', '.join(missing)}"), 400
+    if on_duplicate not in DUPLICATE_POLICIES:
+        return jsonify(error=f"Invalid 'on_duplicate' parameter, must be one of: {', '.join(sorted(DUPLICATE_POLICIES))}"), 400
 
+    tmp_gpx = None
     try:
-        # 3) parse and create the Activity
+        created_at = datetime.strptime(date, "%Y-%m-%dT%H:%M:%SZ")
+
+        # 3) fingerprint the track and check for an already uploaded copy
+        gpx_data = gpx_file.read()
+        gpx_file.stream.seek(0)
+        fingerprint = fingerprint_gpx(
+            gpx_data, int(user_id),
+            fallback_start=created_at,
+            fallback_elapsed=float(elapsed_time)
+        )
+        duplicate = find_duplicate(fingerprint) if fingerprint else None
+        if duplicate and on_duplicate == 'reject':
+            dup_id, match, score = duplicate
+            return jsonify(
+                error="Duplicate activity",
+                duplicate_of=dup_id,
+                match=match,
+                similarity=score
+            ), 409
+        if duplicate and on_duplicate == 'merge':
+            dup_id, match, score = duplicate
+            existing = Activity.query.get(dup_id)
+            tmp_gpx = merge_activity(existing, fingerprint, gpx_file,
+                                     description, float(distance), float(elapsed_time))
+            db.session.commit()
+            # only overwrite the original recording once the merge is saved
+            if tmp_gpx:
+                upload_dir = current_app.config['UPLOAD_FOLDER']
+                os.replace(tmp_gpx, os.path.join(upload_dir, f"gpx_{existing.id}.gpx"))
+            return jsonify({**existing.to_dict(), 'duplicate_of': dup_id, 'match': match}), 200
+
+        # 4) parse and create the Activity
         new_activity = Activity(
             title=title,
             description=description,
-            created_at=datetime.strptime(date, "%Y-%m-%dT%H:%M:%SZ"),
+            created_at=created_at,
             user_id=int(user_id),
             map_id=map_id,  # No longer converting to int since it's now a UUID string
             distance=float(distance),
@@ -277,6 +336,13 @@ def create_activity():
         db.session.add(new_activity)
         db.session.flush()
 
+        # a fingerprint left behind by a deleted activity may hold this (reused) id
+        stale = TrackFingerprint.query.get(new_activity.id)
+        if stale is not None:
+            db.session.delete(stale)
+            db.session.flush()
+        new_activity.fingerprint = fingerprint
+
         # save the GPX file
         upload_dir = current_app.config['UPLOAD_FOLDER']
         os.makedirs(upload_dir, exist_ok=True)
@@ -286,6 +352,8 @@ def create_activity():
         db.session.commit()
     except Exception as e:
         db.session.rollback()
+        if tmp_gpx and os.path.exists(tmp_gpx):
+            os.remove(tmp_gpx)
         print("Error during activity creation:", e)
         return jsonify(error=str(e)), 500
 
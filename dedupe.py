@@ -0,0 +1,87 @@
+# dedupe.py
+# Fingerprint existing activities and remove duplicate uploads.
+# Keeps the oldest activity of each duplicate group, merging in the longer
+# track and any fields it is missing (like on_duplicate=merge on upload).
+#
+#   python dedupe.py            # backfill fingerprints, report duplicates
+#   python dedupe.py --apply    # ...and delete them
+import os
+import sys
+from app import create_app
+from app.extensions import db
+from app.models import Activity
+from app.fingerprint import fingerprint_gpx, find_duplicate, copy_fingerprint, merge_into
+
+
+def backfill_fingerprints(upload_dir):
+    missing = (
+        Activity.query
+                .filter(~Activity.fingerprint.has())
+                .order_by(Activity.id)
+                .all()
+    )
+    added = 0
+    for act in missing:
+        gpx_path = os.path.join(upload_dir, f'gpx_{act.id}.gpx')
+        if not os.path.exists(gpx_path):
+            continue
+        with open(gpx_path, 'rb') as f:
+            fp = fingerprint_gpx(
+                f.read(), act.user_id,
+                fallback_start=act.created_at,
+                fallback_elapsed=act.elapsed_time
+            )
+        if fp:
+            act.fingerprint = fp
+            added += 1
+    db.session.commit()
+    return added
+
+
+def remove_duplicates(upload_dir, apply=False):
+    removed = set()
+    gpx_moves = []    # (duplicate's gpx, survivor's gpx) when the duplicate's track wins
+    gpx_paths = []
+    for act in Activity.query.filter(Activity.fingerprint.has()).order_by(Activity.id).all():
+        duplicate = find_duplicate(act.fingerprint, before_id=act.id, exclude=removed)
+        if not duplicate:
+            continue
+        dup_id, match, score = duplicate
+        print(f"Activity {act.id} duplicates {dup_id} ({match}, similarity {score:.2f})")
+        removed.add(act.id)
+        if not apply:
+            continue
+        survivor = Activity.query.get(dup_id)
+        gpx_path = os.path.join(upload_dir, f'gpx_{act.id}.gpx')
+        took_track = merge_into(survivor, copy_fingerprint(act.fingerprint),
+                                act.description, act.distance, act.elapsed_time)
+        if took_track:
+            gpx_moves.append((gpx_path, os.path.join(upload_dir, f'gpx_{survivor.id}.gpx')))
+        else:
+            gpx_paths.append(gpx_path)
+        db.session.delete(act)
+    if apply:
+        db.session.commit()
+        # only touch the files once the rows are updated for good
+        for src, dst in gpx_moves:
+            if os.path.exists(src):
+                os.replace(src, dst)
+        for gpx_path in gpx_paths:
+            if os.path.exists(gpx_path):
+                os.remove(gpx_path)
+    return removed
+
+
+if __name__ == '__main__':
+    apply = '--apply' in sys.argv
+    app = create_app()
+    with app.app_context():
+        upload_dir = app.config['UPLOAD_FOLDER']
+        print("Fingerprinting activities...")
+        print(f"Added {backfill_fingerprints(upload_dir)} fingerprints")
+        print("Looking for duplicates...")
+        removed = remove_duplicates(upload_dir, apply=apply)
+        if apply:
+            print(f"Removed {len(removed)} duplicate activities")
+        else:
+            print(f"Would remove {len(removed)} duplicate activities (rerun with --apply to delete)")
@@ -0,0 +1,31 @@
+# tests/conftest.py
+import pytest
+from app import create_app
+from app.extensions import db
+from app.models import User, Map
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+    })
+    with app.app_context():
+        user = User(firstname='Ada', lastname='Runner', username='ada', email='ada@example.com')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Map(
+            id='map-1', title='Park', image_path='image_map-1.jpg', user_id=user.id,
+            latitude=40.0, longitude=-75.0, num_points=4
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,48 @@
+# tests/gpx.py
+# Synthetic GPX tracks for the fingerprint tests.
+import math
+import random
+from datetime import datetime, timedelta
+
+START = datetime(2024, 5, 1, 10, 0, 0)
+
+
+def make_gpx(points, start=START, interval=1, times=True):
+    """GPX document for [(lat, lon), ...] sampled every `interval` seconds."""
+    trkpts = []
+    for i, (lat, lon) in enumerate(points):
+        t = ''
+        if times:
+            t = f"<time>{(start + timedelta(seconds=i * interval)).strftime('%Y-%m-%dT%H:%M:%SZ')}</time>"
+        trkpts.append(f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}">{t}</trkpt>')
+    return (
+        '<?xml version="1.0"?>'
+        '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+        + ''.join(trkpts) +
+        '</trkseg></trk></gpx>'
+    ).encode()
+
+
+def out_and_back(km=5.0, step_m=3.0, lat0=40.0, lon0=-75.0):
+    """Points of a straight out-and-back route heading north-east."""
+    n = int(km * 500 / step_m)
+    deg = step_m / 111320.0
+    out = [(lat0 + i * deg, lon0 + i * deg) for i in range(n)]
+    return out + out[::-1]
+
+
+def loop(laps, step_m=4.0, radius_m=64.0, lat0=40.0, lon0=-75.0):
+    """Points of `laps` laps around a 400m track."""
+    per_lap = int(2 * math.pi * radius_m / step_m)
+    deg = radius_m / 111320.0
+    return [
+        (lat0 + deg * math.sin(2 * math.pi * i / per_lap),
+         lon0 + deg * math.cos(2 * math.pi * i / per_lap) / math.cos(math.radians(lat0)))
+        for i in range(laps * per_lap)
+    ]
+
+
+def jitter(points, meters, seed=1):
+    rng = random.Random(seed)
+    deg = meters / 111320.0
+    return [(lat + rng.uniform(-deg, deg), lon + rng.uniform(-deg, deg)) for lat, lon in points]
@@ -0,0 +1,63 @@
+# tests/test_dedupe.py
+import os
+from datetime import timedelta
+from app.extensions import db
+from app.models import Activity, TrackFingerprint, TrackFingerprintBand
+from app.fingerprint import NUM_BANDS
+from dedupe import backfill_fingerprints, remove_duplicates
+from .gpx import START, make_gpx, out_and_back, jitter
+
+
+def seed(upload_dir, tracks):
+    os.makedirs(upload_dir, exist_ok=True)
+    ids = []
+    for gpx, fields in tracks:
+        act = Activity(**{'title': 'Run', 'user_id': 1, 'map_id': 'map-1', 'created_at': START,
+                          'distance': 5000, 'elapsed_time': 1800, **fields})
+        db.session.add(act)
+        db.session.flush()
+        with open(os.path.join(upload_dir, f'gpx_{act.id}.gpx'), 'wb') as f:
+            f.write(gpx)
+        ids.append(act.id)
+    db.session.commit()
+    return ids
+
+
+def test_dedupe_reports_by_default_and_deletes_with_apply(app):
+    upload_dir = app.config['UPLOAD_FOLDER']
+    gpx = make_gpx(out_and_back())
+    first, second = seed(upload_dir, [(gpx, {}), (gpx, {})])
+    assert backfill_fingerprints(upload_dir) == 2
+
+    assert remove_duplicates(upload_dir) == {second}
+    assert Activity.query.count() == 2
+    assert os.path.exists(os.path.join(upload_dir, f'gpx_{second}.gpx'))
+
+    assert remove_duplicates(upload_dir, apply=True) == {second}
+    assert [a.id for a in Activity.query.all()] == [first]
+    assert not os.path.exists(os.path.join(upload_dir, f'gpx_{second}.gpx'))
+    assert os.path.exists(os.path.join(upload_dir, f'gpx_{first}.gpx'))
+
+
+def test_dedupe_keeps_longer_later_track(app):
+    upload_dir = app.config['UPLOAD_FOLDER']
+    # the phone was uploaded first but stopped recording early
+    phone = make_gpx(out_and_back()[:1600])
+    watch = make_gpx(jitter(out_and_back()[::2], 2), interval=2)
+    first, second = seed(upload_dir, [
+        (phone, {'distance': 4700, 'elapsed_time': 1600}),
+        (watch, {'description': 'From the watch'}),
+    ])
+    backfill_fingerprints(upload_dir)
+
+    assert remove_duplicates(upload_dir, apply=True) == {second}
+    act = Activity.query.one()
+    assert act.id == first
+    assert act.description == 'From the watch'
+    assert (act.distance, act.elapsed_time) == (5000, 1800)
+    assert act.fingerprint.end_time == START + timedelta(seconds=2 * 832)
+    assert TrackFingerprint.query.count() == 1
+    assert TrackFingerprintBand.query.count() == NUM_BANDS
+    assert sorted(os.listdir(upload_dir)) == [f'gpx_{first}.gpx']
+    with open(os.path.join(upload_dir, f'gpx_{first}.gpx'), 'rb') as f:
+        assert f.read() == watch
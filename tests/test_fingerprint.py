@@ -0,0 +1,97 @@
+# tests/test_fingerprint.py
+from datetime import timedelta
+from app.extensions import db
+from app.models import Activity
+from app.fingerprint import (
+    NUM_BANDS, geohash, band_keys, minhash, unpack_sketch, similarity,
+    fingerprint_gpx, find_duplicate,
+)
+from .gpx import START, make_gpx, out_and_back, loop, jitter
+
+
+def add_activity(fp, created_at=START):
+    act = Activity(title='Run', user_id=fp.user_id, map_id='map-1',
+                   created_at=created_at, distance=fp.distance, elapsed_time=0)
+    act.fingerprint = fp
+    db.session.add(act)
+    db.session.commit()
+    return act
+
+
+def test_geohash_matches_reference():
+    assert geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geohash(-25.382708, -49.265506, 7) == '6gkzwgj'
+
+
+def test_band_keys_are_prefixed_and_deterministic():
+    sketch = minhash(['dr4e0sh', 'dr4e0sj', 'dr4e0sn'])
+    keys = band_keys(sketch)
+    assert len(keys) == NUM_BANDS
+    assert [k[:2] for k in keys] == [f'{i:02d}' for i in range(NUM_BANDS)]
+    assert keys == band_keys(minhash(['dr4e0sn', 'dr4e0sh', 'dr4e0sj']))
+
+
+def test_fingerprint_reads_times_and_length():
+    fp = fingerprint_gpx(make_gpx(out_and_back(), interval=2), user_id=1)
+    assert fp.start_time == START
+    assert fp.end_time == START + timedelta(seconds=2 * 1665)
+    assert 6000 < fp.distance < 6500
+    assert len(fp.bands) == NUM_BANDS
+    assert len(unpack_sketch(fp.sketch)) == 64
+
+
+def test_fingerprint_falls_back_to_activity_times():
+    fp = fingerprint_gpx(make_gpx(out_and_back(), times=False), user_id=1,
+                         fallback_start=START, fallback_elapsed=1800)
+    assert fp.start_time == START
+    assert fp.end_time == START + timedelta(seconds=1800)
+
+
+def test_fingerprint_skips_unusable_gpx():
+    assert fingerprint_gpx(b'not xml', user_id=1) is None
+    assert fingerprint_gpx(make_gpx([]), user_id=1) is None
+
+
+def test_exact_duplicate(app):
+    data = make_gpx(out_and_back())
+    original = add_activity(fingerprint_gpx(data, user_id=1))
+    assert find_duplicate(fingerprint_gpx(data, user_id=1)) == (original.id, 'exact', 1.0)
+
+
+def test_near_duplicate_from_second_device(app):
+    watch = add_activity(fingerprint_gpx(make_gpx(out_and_back()), user_id=1))
+    phone = make_gpx(jitter(out_and_back()[::3], 5), start=START + timedelta(seconds=4), interval=3)
+    dup_id, match, score = find_duplicate(fingerprint_gpx(phone, user_id=1))
+    assert (dup_id, match) == (watch.id, 'near')
+    assert score >= 0.8
+
+
+def test_other_user_and_other_route_are_not_duplicates(app):
+    add_activity(fingerprint_gpx(make_gpx(out_and_back()), user_id=1))
+    assert find_duplicate(fingerprint_gpx(make_gpx(out_and_back()), user_id=2)) is None
+    other_route = make_gpx(out_and_back(lat0=40.5))
+    assert find_duplicate(fingerprint_gpx(other_route, user_id=1)) is None
+
+
+def test_same_route_on_another_day_is_not_a_duplicate(app):
+    add_activity(fingerprint_gpx(make_gpx(out_and_back()), user_id=1))
+    tomorrow = make_gpx(jitter(out_and_back(), 3), start=START + timedelta(days=1))
+    assert find_duplicate(fingerprint_gpx(tomorrow, user_id=1)) is None
+
+
+def test_warm_up_and_workout_on_same_loop_are_not_duplicates(app):
+    warm_up = fingerprint_gpx(make_gpx(loop(2)), user_id=1)
+    add_activity(warm_up)
+    workout = fingerprint_gpx(make_gpx(loop(10), start=START + timedelta(minutes=9)), user_id=1)
+    # the loops cover the same cells, only end time and length tell them apart
+    assert similarity(unpack_sketch(warm_up.sketch), unpack_sketch(workout.sketch)) == 1.0
+    assert find_duplicate(workout) is None
+
+
+def test_before_id_and_exclude(app):
+    data = make_gpx(out_and_back())
+    first = add_activity(fingerprint_gpx(data, user_id=1))
+    second = add_activity(fingerprint_gpx(data, user_id=1))
+    assert find_duplicate(second.fingerprint, before_id=second.id)[0] == first.id
+    assert find_duplicate(second.fingerprint, before_id=first.id) is None
+    assert find_duplicate(second.fingerprint, before_id=second.id, exclude={first.id}) is None
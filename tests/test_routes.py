@@ -0,0 +1,129 @@
+# tests/test_routes.py
+import io
+import os
+from datetime import timedelta
+from app.extensions import db
+from app.models import Activity, TrackFingerprint
+from .gpx import START, make_gpx, out_and_back, jitter
+
+
+def upload(client, gpx, on_duplicate=None, **fields):
+    data = {
+        'title': 'Morning run',
+        'date': START.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'user_id': '1',
+        'map_id': 'map-1',
+        'distance': '5000',
+        'elapsed_time': '1800',
+        'gpx': (io.BytesIO(gpx), 'run.gpx'),
+        **fields,
+    }
+    if on_duplicate:
+        data['on_duplicate'] = on_duplicate
+    return client.post('/activities/upload', data=data, content_type='multipart/form-data')
+
+
+def test_duplicate_upload_is_rejected(client):
+    gpx = make_gpx(out_and_back())
+    first = upload(client, gpx)
+    assert first.status_code == 201
+
+    resp = upload(client, gpx)
+    assert resp.status_code == 409
+    assert resp.get_json()['duplicate_of'] == first.get_json()['id']
+    assert resp.get_json()['match'] == 'exact'
+    assert Activity.query.count() == 1
+
+
+def test_duplicate_upload_allowed(client):
+    gpx = make_gpx(out_and_back())
+    upload(client, gpx)
+    assert upload(client, gpx, on_duplicate='allow').status_code == 201
+    assert Activity.query.count() == 2
+
+
+def test_invalid_duplicate_policy(client):
+    assert upload(client, make_gpx(out_and_back()), on_duplicate='ignore').status_code == 400
+
+
+def test_merge_keeps_longer_track(app, client):
+    # the phone stopped recording a few minutes before the watch did
+    short = make_gpx(out_and_back()[:1600])
+    first = upload(client, short, distance='4700', elapsed_time='1600').get_json()
+
+    watch = make_gpx(jitter(out_and_back()[::2], 2), interval=2)
+    resp = upload(client, watch, on_duplicate='merge',
+                  title='Watch run', description='From the watch')
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['id'] == first['id']
+    assert body['match'] == 'near'
+    assert body['title'] == 'Morning run'
+    assert body['description'] == 'From the watch'
+    assert body['distance'] == 5000
+    assert body['elapsed_time'] == 1800
+
+    act = Activity.query.get(first['id'])
+    assert act.fingerprint.end_time == START + timedelta(seconds=2 * 832)
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], f"gpx_{act.id}.gpx"), 'rb') as f:
+        assert f.read() == watch
+    assert Activity.query.count() == 1
+
+
+def test_merge_keeps_existing_longer_track(app, client):
+    full = make_gpx(out_and_back())
+    first = upload(client, full).get_json()
+
+    resp = upload(client, make_gpx(out_and_back()[:1600]), on_duplicate='merge',
+                  distance='4700', elapsed_time='1600')
+    assert resp.status_code == 200
+    assert resp.get_json()['distance'] == 5000
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], f"gpx_{first['id']}.gpx"), 'rb') as f:
+        assert f.read() == full
+
+
+def orphan_fingerprint(client, gpx):
+    """Upload `gpx`, then delete its activity row behind the ORM's back."""
+    first = upload(client, gpx).get_json()
+    db.session.execute(db.text('DELETE FROM activity WHERE id = :id'), {'id': first['id']})
+    db.session.commit()
+
+
+def test_orphaned_fingerprint_is_not_a_duplicate(client):
+    gpx = make_gpx(out_and_back())
+    orphan_fingerprint(client, gpx)
+    assert upload(client, gpx).status_code == 201
+    assert Activity.query.count() == 1
+
+
+def test_orphaned_fingerprint_with_allow(client):
+    gpx = make_gpx(out_and_back())
+    orphan_fingerprint(client, gpx)
+    resp = upload(client, gpx, on_duplicate='allow')
+    assert resp.status_code == 201
+    act = Activity.query.get(resp.get_json()['id'])
+    assert act.fingerprint is not None
+    assert TrackFingerprint.query.count() == 1
+
+
+def test_orphaned_fingerprint_with_merge(client):
+    gpx = make_gpx(out_and_back())
+    orphan_fingerprint(client, gpx)
+    assert upload(client, gpx, on_duplicate='merge').status_code == 201
+    assert Activity.query.count() == 1
+
+
+def test_failed_merge_keeps_original_gpx(app, client, monkeypatch):
+    short = make_gpx(out_and_back()[:1600])
+    first = upload(client, short, distance='4700', elapsed_time='1600').get_json()
+
+    def fail():
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(db.session, 'commit', fail)
+    resp = upload(client, make_gpx(out_and_back()), on_duplicate='merge')
+    assert resp.status_code == 500
+
+    upload_dir = app.config['UPLOAD_FOLDER']
+    assert sorted(os.listdir(upload_dir)) == [f"gpx_{first['id']}.gpx"]
+    with open(os.path.join(upload_dir, f"gpx_{first['id']}.gpx"), 'rb') as f:
+        assert f.read() == short